@@ -1,7 +1,12 @@
 from fastapi import APIRouter, UploadFile, File, Form
-from app.services.summarize import run_pipeline
+from app.services.summarize import run_pipeline, warm_up
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from pathlib import Path
 from typing import Optional
+import multiprocessing as mp
+import asyncio
 import shutil
 import uuid
 import os
@@ -10,16 +15,35 @@ import tempfile
 
 router = APIRouter()
 
+# Each worker process holds its own Whisper/Senopati instances, so requests run
+# concurrently instead of blocking the event loop one at a time.
+# spawn avoids forking a parent that may already hold CUDA state.
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "2"))
+
+def _create_executor():
+    return ProcessPoolExecutor(
+        max_workers=PIPELINE_WORKERS,
+        mp_context=mp.get_context("spawn"),
+        initializer=warm_up
+    )
+
+executor = _create_executor()
+
+def shutdown_executor():
+    executor.shutdown(wait=False, cancel_futures=True)
+
 @router.post("/process")
 async def process_file(
     file: UploadFile = File(...),
     denoise: bool = Form(False),
     aggressive_denoise: bool = Form(False),
     force_wav: bool = Form(False),
-    transcriber_model: str = Form("small"),
-    chunk_size: int = Form(2000),
-    language: Optional[str] = Form(None)
+    transcriber_model: Optional[str] = Form(None),
+    chunk_size: Optional[int] = Form(None),
+    language: Optional[str] = Form(None),
+    batch_size: Optional[int] = Form(None)
 ):  
+    global executor
     temp_dir = tempfile.gettempdir()
     temp_filename = os.path.join(temp_dir, f"{uuid.uuid4()}_{file.filename}")
     
@@ -27,15 +51,26 @@ async def process_file(
         with open(temp_filename, "wb") as f:
             shutil.copyfileobj(file.file, f)
 
-        result = run_pipeline(
-            input_file=Path(temp_filename),
-            denoise=denoise,
-            aggressive_denoise=aggressive_denoise,
-            force_wav=force_wav,
-            transcriber_model=transcriber_model,
-            chunk_size=chunk_size,
-            language=language
-        )
+        pool = executor
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(pool, partial(
+                run_pipeline,
+                input_file=Path(temp_filename),
+                denoise=denoise,
+                aggressive_denoise=aggressive_denoise,
+                force_wav=force_wav,
+                transcriber_model=transcriber_model,
+                chunk_size=chunk_size,
+                language=language,
+                batch_size=batch_size
+            ))
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM-killed); the pool refuses all further work,
+            # so replace it once for everyone waiting on the broken one
+            if executor is pool:
+                executor = _create_executor()
+            return {"error": "Pipeline worker crashed, please retry"}
         return result
     finally:
         if os.path.exists(temp_filename):
@@ -1,21 +1,31 @@
+import os
 import json
+import queue
+import hashlib
+import tempfile
+import time
+import threading
+import functools
+import contextlib
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Progress output only in debug runs (DEBUG=1); production skips the per-call stdout writes.
+# Errors and warnings keep using print.
+DEBUG = os.getenv("DEBUG", "0").lower() in ("1", "true")
+log = print if DEBUG else (lambda *args, **kwargs: None)
+
 class JSONLogger:
     def __init__(self, log_file="logs/apps.json"):
         self.log_file = Path(log_file)
         self.log_file.parent.mkdir(parents=True, exist_ok=True)
         self.logs = []
-
-        if self.log_file.exists():
-            try:
-                with open(self.log_file, 'r', encoding='utf-8') as f:
-                    existing_runs = json.load(f)
-                self.run_id = len(existing_runs) + 1
-            except Exception:
-                self.run_id = 1  
-        else:
-            self.run_id = 1
+        # assigned by save() under the log file lock
+        self.run_id = None
         
     def log(self, step, status, message, **kwargs):
         log_entry = {
@@ -26,28 +36,172 @@ class JSONLogger:
         }
         self.logs.append(log_entry)
         
-        # Also print to console for immediate feedback
+        # Also print to console for immediate feedback; records are only serialized in save()
         status_emoji = {"SUCCESS": "✅", "ERROR": "❌", "INFO": "ℹ️", "WARNING": "⚠️"}
-        print(f"{status_emoji.get(status, '📝')} [{step}] {message}")
+        emit = print if status in ("ERROR", "WARNING") else log
+        emit(f"{status_emoji.get(status, '📝')} [{step}] {message}")
 
     def save(self): 
-        current_run = {
-            "run_id": self.run_id,
-            "logs": self.logs
-        }
-        
+        # Pipeline workers run in separate processes; hold the lock across read-modify-write
+        with file_lock(self.log_file):
+            self._save()
+
+    def _save(self):
         if self.log_file.exists():
             try:
                 with open(self.log_file, 'r', encoding='utf-8') as f:
                     existing_runs = json.load(f)
-                if isinstance(existing_runs, list):
-                    existing_runs.append(current_run)
-                else:
-                    existing_runs = [existing_runs, current_run]
-            except Exception:
-                existing_runs = [current_run]
+                if not isinstance(existing_runs, list):
+                    existing_runs = [existing_runs]
+            except Exception as e:
+                # keep the unreadable history for inspection instead of overwriting it
+                corrupt_file = self.log_file.with_name(f"{self.log_file.name}.corrupt-{int(time.time())}")
+                os.replace(self.log_file, corrupt_file)
+                print(f"Unreadable log file moved to {corrupt_file}: {e}")
+                existing_runs = []
         else:
-            existing_runs = [current_run]
+            existing_runs = []
+
+        # numbered under the lock so concurrent runs don't share an id
+        self.run_id = len(existing_runs) + 1
+        existing_runs.append({
+            "run_id": self.run_id,
+            "logs": self.logs
+        })
+        write_json_atomic(self.log_file, existing_runs, indent=2)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Exclusive inter-process lock on a sidecar "<path>.lock" file (no-op without fcntl).
+    """
+    if fcntl is None:
+        yield
+        return
+    lock_path = Path(f"{path}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_json_atomic(path, data, **dump_kwargs):
+    """
+    Write JSON to a temp file in the same folder and rename it over path,
+    so readers in other processes never see a half-written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=path.parent, suffix=".tmp", delete=False) as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+    os.replace(f.name, path)
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache. An entry is keyed by the SHA-256 of the exact
+    prompt text plus a namespace, so a response is only reused for the same input.
+    One file per entry keeps concurrent writers from clobbering each other.
+    """
+    def __init__(self, cache_dir="data/cache/responses"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, text, namespace):
+        digest = hashlib.sha256(f"{namespace}\0{text}".encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def get(self, text, namespace):
+        path = self._path(text, namespace)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)["response"]
+        except Exception:
+            return None
+
+    def set(self, text, namespace, response):
+        write_json_atomic(self._path(text, namespace), {"response": response})
+
+
+@functools.lru_cache(maxsize=1)
+def get_response_cache():
+    return ResponseCache()
+
+
+def response_cached(func):
+    """
+    Cache a method whose first argument is the prompt text. The remaining arguments
+    (e.g. language) are part of the cache namespace and must match exactly.
+    The method returns (response, ok); only ok responses are stored.
+    """
+    @functools.wraps(func)
+    def wrapper(self, text, *args, **kwargs):
+        namespace = f"{func.__qualname__}:{args}:{sorted(kwargs.items())}"
+        cache = get_response_cache()
+        cached = cache.get(text, namespace)
+        if cached is not None:
+            return cached, True
+
+        response, ok = func(self, text, *args, **kwargs)
+        if ok:
+            try:
+                cache.set(text, namespace, response)
+            except OSError as e:
+                print(f"Failed to write response cache: {e}")
+        return response, ok
+    return wrapper
+
+
+def prefetch(iterable, maxsize=4):
+    """
+    Consume iterable on a background thread, buffering up to maxsize items
+    so the producer keeps working while the caller processes earlier items.
+    If the caller stops early, the producer stops too and the source is closed
+    (for stream_audio that kills FFmpeg).
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    done = object()
+    stop = threading.Event()
+    errors = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+            put(done)
 
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_runs, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+    if errors:
+        raise errors[0]
@@ -1,7 +1,7 @@
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.endpoints import router
+from app.api.endpoints import router, shutdown_executor
 
 app = FastAPI(
     title="Summarize AI API",
@@ -19,6 +19,7 @@ app.add_middleware(
 )
 
 app.include_router(router)
+app.add_event_handler("shutdown", shutdown_executor)
 
 @app.get("/")
 async def root():
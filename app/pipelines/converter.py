@@ -1,6 +1,8 @@
 from pathlib import Path
 import numpy as np
 import subprocess 
+import tempfile
+from app.helper import log
 
 # Penjelasan dan Sumber
 # kenapa menggunakan 16000Hz? 
@@ -41,9 +43,9 @@ def convert_video_to_audio(input_path: Path, output_path: Path, target_sr=16000)
     ]
     
     try:
-        print(f"Converting '{input_path.name}' using FFmpeg...")
+        log(f"Converting '{input_path.name}' using FFmpeg...")
         result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print(f"FFmpeg output: {result.stdout.decode()}")
+        log(f"FFmpeg output: {result.stdout.decode()}")
         return output_path
         
     except subprocess.CalledProcessError as e:
@@ -66,12 +68,105 @@ def convert_audio_format(input_path: Path, output_path: Path, target_sr=16000):
     ]
     
     try:
-        print(f"Converting {input_path.name} to standardized WAV format using ffmpeg...")
+        log(f"Converting {input_path.name} to standardized WAV format using ffmpeg...")
         result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print(f"FFmpeg output: {result.stdout.decode()}")
+        log(f"FFmpeg output: {result.stdout.decode()}")
         return output_path
 
     except subprocess.CalledProcessError as e:
         print(f"Error converting audio format with FFmpeg for file: {input_path.name}")
         print(f"FFmpeg stderr: {e.stderr.decode()}")
         return None
+
+
+def get_duration(input_path: Path):
+    """
+    Read the media duration in seconds from the container header using ffprobe.
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        str(input_path)
+    ]
+
+    try:
+        result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return float(result.stdout.decode().strip())
+
+    except (subprocess.CalledProcessError, ValueError) as e:
+        print(f"Error reading duration with ffprobe for file: {input_path.name}: {e}")
+        return None
+
+# -af : audio filter graph, highpass removes rumble below 80Hz and afftdn is FFmpeg's FFT denoiser
+#       (nr = noise reduction in dB)
+
+def convert_and_denoise(input_path: Path, output_path: Path, target_sr=16000):
+    """
+    Resample to mono WAV and denoise in a single FFmpeg pass.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    command = [
+        'ffmpeg',
+        '-i', str(input_path),
+        '-vn',
+        '-af', 'highpass=f=80,afftdn=nr=12',
+        '-acodec', 'pcm_s16le',
+        '-ar', str(target_sr),
+        '-ac', '1',
+        '-y', str(output_path)
+    ]
+
+    try:
+        log(f"Converting and denoising '{input_path.name}' using FFmpeg...")
+        result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        log(f"FFmpeg output: {result.stdout.decode()}")
+        return output_path
+
+    except subprocess.CalledProcessError as e:
+        print(f"Error converting and denoising with FFmpeg for file: {input_path.name}")
+        print(f"FFmpeg stderr: {e.stderr.decode()}")
+        return None
+
+def stream_audio(input_path: Path, target_sr=16000, chunk_seconds=30):
+    """
+    Decode any audio/video input with FFmpeg and yield mono float32 windows of chunk_seconds.
+    Raw PCM is read from FFmpeg's stdout, so no intermediate WAV file is written.
+    """
+    command = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-i', str(input_path),
+        '-vn',
+        '-f', 's16le',
+        '-acodec', 'pcm_s16le',
+        '-ar', str(target_sr),
+        '-ac', '1',
+        '-'
+    ]
+
+    log(f"Streaming '{input_path.name}' through FFmpeg...")
+    # stderr goes to a file, not a pipe: nobody reads it until stdout hits EOF, so a
+    # corrupt upload's error lines could fill a pipe and deadlock FFmpeg with us
+    error_log = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_log)
+    chunk_bytes = target_sr * chunk_seconds * 2  # 16-bit samples
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+        if process.wait() != 0:
+            error_log.seek(0)
+            stderr = error_log.read().decode(errors="replace")
+            raise RuntimeError(f"FFmpeg failed to decode {input_path.name}: {stderr}")
+    finally:
+        # consumer stopped early or decoding failed
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        error_log.close()
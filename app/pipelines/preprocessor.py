@@ -8,6 +8,7 @@ from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 import multiprocessing as mp
 from .converter import convert_audio_format
+from app.helper import log
 
 def audio_quality(data: np.ndarray, sr: int) -> dict:
     """
@@ -165,14 +166,15 @@ def normalize_audio(data: np.ndarray, target_level: float = -20.0) -> np.ndarray
     data = np.clip(data, -0.95, 0.95)
     return data
 
-def enhance_audio(input_path: Path, aggressive_mode: bool = False, use_parallel: bool = True):
+def enhance_audio(input_path: Path, aggressive_mode: bool = False, use_parallel: bool = True, target_sr: int = 16000):
     """
     Enhanced audio preprocessing with quality assessment and adaptive processing.
+    Returns the enhanced mono waveform as float32 at target_sr, ready for Whisper.
     """
     try:
         # Ensure audio is in WAV format with consistent sample rate
         if input_path.suffix.lower() != '.wav':
-            print(f"Converting {input_path.name} to WAV format...")
+            log(f"Converting {input_path.name} to WAV format...")
             wav_path = convert_audio_format(input_path)
         else:
             wav_path = input_path
@@ -184,36 +186,34 @@ def enhance_audio(input_path: Path, aggressive_mode: bool = False, use_parallel:
         if len(data.shape) > 1:
             data = np.mean(data, axis=1)
         
-        print(f"Processing audio: {wav_path.name}")
-        print(f"Sample rate: {rate} Hz, Duration: {len(data)/rate:.2f} seconds")
+        log(f"Processing audio: {wav_path.name}")
+        log(f"Sample rate: {rate} Hz, Duration: {len(data)/rate:.2f} seconds")
         if use_parallel:
-            print(f"Parallel processing enabled with {max(1, mp.cpu_count() - 1)} workers")
+            log(f"Parallel processing enabled with {max(1, mp.cpu_count() - 1)} workers")
         
         # Assess audio quality
         quality_info = audio_quality(data, rate)
-        print(f"Audio quality assessment: {quality_info['quality_level']} quality")
-        print(f"  - Spectral rolloff: {quality_info['spectral_rolloff']:.0f} Hz")
-        print(f"  - RMS energy: {quality_info['rms_energy']:.4f}")
+        log(f"Audio quality assessment: {quality_info['quality_level']} quality")
+        log(f"  - Spectral rolloff: {quality_info['spectral_rolloff']:.0f} Hz")
+        log(f"  - RMS energy: {quality_info['rms_energy']:.4f}")
         
         # Apply adaptive enhancement
         if aggressive_mode:
             # Force low quality processing for very noisy audio
             quality_info["quality_level"] = "low"
-            print("Aggressive mode enabled - applying maximum noise reduction")
+            log("Aggressive mode enabled - applying maximum noise reduction")
         
         enhanced_data = enhance_audio_adaptive(data, rate, quality_info, use_parallel=use_parallel)
         
         # Normalize audio level
         enhanced_data = normalize_audio(enhanced_data)
-        
-        # Save enhanced audio
-        output_dir = input_path.parent / "enhanced"
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_path = output_dir / f"{input_path.stem}_enhanced.wav"
-        
-        sf.write(str(output_path), enhanced_data, rate, subtype='PCM_16')
-        print(f"Enhanced audio saved to: {output_path}")
-        return output_path
+
+        # Whisper expects 16kHz input
+        if rate != target_sr:
+            enhanced_data = librosa.resample(enhanced_data, orig_sr=rate, target_sr=target_sr)
+
+        log(f"Enhanced audio ready: {len(enhanced_data)/target_sr:.2f} seconds at {target_sr} Hz")
+        return enhanced_data.astype(np.float32)
         
     except Exception as e:
         print(f"Error enhancing audio: {e}")
@@ -1,17 +1,29 @@
 import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) seconds; a request that never answers would otherwise hold a
+# correction thread, and with it the whole pipeline worker, forever
+REQUEST_TIMEOUT = (5, 120)
 
 class SenopatiModel:
-    def __init__(self, base_url="https://senopati.its.ac.id/senopati-lokal-dev/generate"):
+    def __init__(self, base_url="https://senopati.its.ac.id/senopati-lokal-dev/generate", pool_size=8, timeout=REQUEST_TIMEOUT):
         self.base_url = base_url
+        self.timeout = timeout
+        # Reuse keep-alive connections instead of a new TCP/TLS handshake per prompt;
+        # pool_size should match the number of parallel correction requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
-    def generate_content(self, prompt: str):
+    def generate_content(self, prompt: str, max_tokens: int = 300):
         payload = {
             "prompt": prompt,
-            "max_tokens": 300,
+            "max_tokens": max_tokens,
             "temperature": 0.3
         }
-        
-        response = requests.post(self.base_url, json=payload)
+
+        response = self.session.post(self.base_url, json=payload, timeout=self.timeout)
         response.raise_for_status()
         data = response.json()
 
@@ -51,4 +51,22 @@ class Transcriber:
             print(f"Error in language correction: {e}")
             return transcript
 
-        
+
+def chunk_from_segments(segments, chunk_size):
+    """
+    Group Whisper segment texts into chunks of at least chunk_size characters,
+    without building and re-splitting the full transcript string.
+    """
+    chunks = []
+    current = []
+    current_length = 0
+    for text in segments:
+        current.append(text)
+        current_length += len(text)
+        if current_length >= chunk_size:
+            chunks.append("".join(current).strip())
+            current = []
+            current_length = 0
+    if current:
+        chunks.append("".join(current).strip())
+    return chunks
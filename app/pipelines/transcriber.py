@@ -1,32 +1,82 @@
-import whisper
+from faster_whisper import WhisperModel, BatchedInferencePipeline, decode_audio
+from faster_whisper.vad import get_speech_timestamps
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import threading
+import numpy as np
+from app.helper import response_cached, log
+import ctranslate2
 import time
+import os
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 30
+# concurrent SenopatiModel requests, keeps us under the API rate limit
+CORRECTION_WORKERS = 8
+# a correction should be about as long as its input; ~2 chars per token leaves headroom
+CORRECTION_CHARS_PER_TOKEN = 2
+# shorter replies than this fraction of the input are treated as truncated
+CORRECTION_MIN_RATIO = 0.8
+
+def cuda_available():
+    return ctranslate2.get_cuda_device_count() > 0
+
+def advise_sequential(file_path):
+    """
+    Tell the kernel the file will be read front to back so it starts readahead
+    before the decoder asks for the data. No-op where posix_fadvise is missing.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(str(file_path), os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
 
 class Transcriber:
     """
-    Transcribe audio using OpenAI Whisper + post-processing with SenopatiModel.
+    Transcribe audio using faster-whisper (CTranslate2) + post-processing with SenopatiModel.
     """
-    def __init__(self, model_name="small", senopati_model=None):
-        print(f"load whisper model: '{model_name}'")
+    def __init__(self, model_name="small", senopati_model=None, device=None, compute_type=None, num_workers=4):
+        log(f"load whisper model: '{model_name}'")
         start_time = time.time()
-        self.model = whisper.load_model(model_name)
+        # GPU when CUDA is present; INT8 weights with FP16 activations on GPU, pure INT8 on CPU.
+        # Pass compute_type="float16" to run full FP16 on GPU instead.
+        self.device = device or ("cuda" if cuda_available() else "cpu")
+        self.compute_type = compute_type or ("int8_float16" if self.device == "cuda" else "int8")
+        # num_workers lets CTranslate2 decode chunks from several threads in parallel
+        self.num_workers = num_workers
+        self.model = WhisperModel(model_name, device=self.device, compute_type=self.compute_type, num_workers=num_workers)
+        self.batched_model = BatchedInferencePipeline(model=self.model)
         self.senopati = senopati_model
-        print(f"model successfully loaded in {time.time() - start_time:.2f} seconds.")
+        log(f"model successfully loaded in {time.time() - start_time:.2f} seconds ({self.device}, {self.compute_type}).")
 
-    def transcribe(self, file_path, language=None):
-        print(f"start transcribing: {file_path}")
+    def transcribe(self, file_path, language=None, batch_size=None):
+        """
+        file_path may also be a 16kHz mono float32 waveform (np.ndarray), which skips decoding.
+        """
+        source = f"{len(file_path) / SAMPLE_RATE:.2f}s waveform" if isinstance(file_path, np.ndarray) else file_path
+        log(f"start transcribing: {source}")
         if language:
-            print(f"Forcing transcription in language: {language}")
+            log(f"Forcing transcription in language: {language}")
         else:
-            print("Language not specified, using auto-detection.")
+            log("Language not specified, using auto-detection.")
 
         start_time = time.time()
         try:
-            options = {"language": language} if language else {}
-            result = self.model.transcribe(str(file_path), **options)
+            if batch_size:
+                segments, detected_language = self._transcribe_batched(file_path, language, batch_size)
+            else:
+                segments, detected_language = self._transcribe_chunked(file_path, language)
 
-            print(f"transcribed {time.time() - start_time:.2f} seconds.")
-            print(f"Detected language: {result['language']}")
-            return result['text'], result['language']
+            log(f"transcribed {time.time() - start_time:.2f} seconds.")
+            log(f"Detected language: {detected_language}")
+            return "".join(segments), detected_language, segments
 
         except FileNotFoundError:
             print(f"Error: File '{file_path}' not found.")
@@ -34,14 +84,162 @@ class Transcriber:
         except Exception as e:
             print(f"Error: {e}")
             return None
-            
+
+    def transcribe_stream(self, audio_chunks, language=None, max_pending=None):
+        """
+        Transcribe 16kHz float32 windows as they are produced (e.g. by converter.stream_audio).
+        Each window goes to the thread pool on arrival instead of waiting for the full decode;
+        at most max_pending windows are queued or decoding at once, which bounds memory.
+        """
+        log("start transcribing audio stream")
+        start_time = time.time()
+        pending = threading.BoundedSemaphore(max_pending or 2 * self.num_workers)
+
+        def run(chunk, language):
+            try:
+                return self._transcribe_chunk(chunk, language)
+            finally:
+                pending.release()
+
+        try:
+            chunks = self._voiced_windows(audio_chunks)
+            first = next(chunks, None)
+            if first is None:
+                print("Warning: audio is empty.")
+                return "", language, []
+
+            detected_language = language or self._detect_language(first)
+            segments = []
+            futures = []
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                for chunk in itertools.chain([first], chunks):
+                    pending.acquire()
+                    futures.append(executor.submit(run, chunk, detected_language))
+                for future in futures:
+                    segments.extend(future.result()[0])
+
+            log(f"transcribed {len(futures)} streamed chunks in {time.time() - start_time:.2f} seconds.")
+            log(f"Detected language: {detected_language}")
+            return "".join(segments), detected_language, segments
+
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+        finally:
+            # stop the producer (and FFmpeg) if we bailed out before the stream ended
+            close = getattr(audio_chunks, "close", None)
+            if close is not None:
+                close()
+
+    def _transcribe_chunked(self, file_path, language=None):
+        """
+        Pack speech into windows of up to 30s and decode them concurrently on the thread pool.
+        """
+        chunks = self._chunk_audio(file_path)
+        if not chunks:
+            print("Warning: audio is empty.")
+            return [], language
+
+        # Pin the language once so chunks don't each run their own auto-detection
+        detected_language = language or self._detect_language(chunks[0])
+        segments = []
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            for chunk_segments, _ in executor.map(lambda chunk: self._transcribe_chunk(chunk, detected_language), chunks):
+                segments.extend(chunk_segments)
+        log(f"decoded {len(chunks)} chunks")
+        return segments, detected_language
+
+    def _transcribe_batched(self, file_path, language, batch_size):
+        """
+        Stack speech windows into [batch, n_mels, 3000] batches and run one forward pass per batch.
+        """
+        audio = self._load_audio(file_path)
+        segments, info = self.batched_model.transcribe(audio, language=language, batch_size=batch_size, beam_size=5)
+        return [segment.text for segment in segments], info.language
+
+    def _chunk_audio(self, file_path, seconds=CHUNK_SECONDS):
+        """
+        Decode audio to 16kHz mono float32 and pack its speech regions into windows of at most `seconds`.
+        """
+        audio = self._load_audio(file_path)
+        speech = self._speech_regions(audio, seconds)
+        return list(self._pack_regions((audio[ts["start"]:ts["end"]] for ts in speech), seconds))
+
+    def _load_audio(self, file_path):
+        if isinstance(file_path, np.ndarray):
+            return file_path
+        advise_sequential(file_path)
+        return decode_audio(str(file_path), sampling_rate=SAMPLE_RATE)
+
+    def _speech_regions(self, audio, seconds=CHUNK_SECONDS):
+        """
+        Voiced regions from Silero VAD (bundled with faster-whisper), each at most `seconds` long,
+        so silence never reaches the decoder and every region fits in one window.
+        """
+        return get_speech_timestamps(audio, max_speech_duration_s=seconds)
+
+    def _pack_regions(self, regions, seconds=CHUNK_SECONDS):
+        """
+        Group whole speech regions into windows of at most `seconds`. Windows are decoded
+        independently, so cutting only between regions keeps words from being split.
+        """
+        step = seconds * SAMPLE_RATE
+        window, size = [], 0
+        for region in regions:
+            if window and size + len(region) > step:
+                yield np.concatenate(window)
+                window, size = [], 0
+            window.append(region)
+            size += len(region)
+        if window:
+            yield np.concatenate(window)
+
+    def _voiced_windows(self, audio_chunks, seconds=CHUNK_SECONDS):
+        """
+        Same windows as _chunk_audio, built from streamed audio as it arrives.
+        """
+        return self._pack_regions(self._stream_regions(audio_chunks, seconds), seconds)
+
+    def _stream_regions(self, audio_chunks, seconds=CHUNK_SECONDS):
+        """
+        Speech regions of a streamed waveform. The last region of each buffer may continue
+        into the next chunk, so its audio is held back and re-detected with what follows.
+        """
+        tail = np.zeros(0, dtype=np.float32)
+        for chunk in audio_chunks:
+            buffer = np.concatenate([tail, chunk])
+            speech = self._speech_regions(buffer, seconds)
+            for ts in speech[:-1]:
+                yield buffer[ts["start"]:ts["end"]]
+            tail = buffer[speech[-1]["start"]:] if speech else buffer[:0]
+        for ts in self._speech_regions(tail, seconds):
+            yield tail[ts["start"]:ts["end"]]
+
+    def _detect_language(self, audio):
+        """
+        Detect the language from the log-Mel of the first 30s window: one encoder pass and
+        a single decoder step, so every chunk can be dispatched without waiting for a full decode.
+        """
+        features = self.model.feature_extractor(audio[:CHUNK_SECONDS * SAMPLE_RATE])
+        language, probability, _ = self.model.detect_language(features=features)
+        log(f"Language '{language}' detected with probability {probability:.2f}")
+        return language
+
+    def _transcribe_chunk(self, audio, language=None):
+        # Windows hold only VAD speech regions already, no need for a second VAD pass
+        segments, info = self.model.transcribe(audio, language=language, vad_filter=False, beam_size=5)
+        # segments is a lazy generator, decoding happens while collecting
+        return [segment.text for segment in segments], info.language
+
+    @response_cached
     def language_rules(self, transcript, language):
         """
         Correct the transcript using SenopatiModel.
+        Returns (text, ok); ok is False when the raw transcript is handed back as a fallback.
         """
         if self.senopati is None:
             print("Warning: SenopatiModel not provided. Returning raw transcript.")
-            return transcript
+            return transcript, False
 
         prompt = (
             f"Koreksi transkrip berikut agar sesuai kaidah bahasa {language}. "
@@ -50,8 +248,23 @@ class Transcriber:
         )
 
         try:
-            response = self.senopati.generate(prompt)
-            return response.strip()
+            max_tokens = max(300, len(transcript) // CORRECTION_CHARS_PER_TOKEN)
+            corrected = self.senopati.generate_content(prompt, max_tokens=max_tokens).text.strip()
+            if len(corrected) < CORRECTION_MIN_RATIO * len(transcript):
+                print(f"Warning: correction looks truncated ({len(corrected)}/{len(transcript)} chars). Keeping raw transcript.")
+                return transcript, False
+            return corrected, True
         except Exception as e:
             print(f"Error in language correction: {e}")
-            return transcript
+            return transcript, False
+
+    def correct_chunks(self, chunks, language, max_workers=CORRECTION_WORKERS):
+        """
+        Run language_rules on every chunk concurrently. Latency becomes the slowest
+        chunk instead of the sum, and results keep the original chunk order.
+        Returns the corrected chunks and how many of them fell back to the raw text.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda chunk: self.language_rules(chunk, language), chunks))
+        failed = sum(1 for _, ok in results if not ok)
+        return [text for text, _ in results], failed
@@ -1,23 +1,160 @@
 import os
+import json
+import hashlib
+import math
+import time
+import uuid
+import shutil
+import functools
 from pathlib import Path
 from dotenv import load_dotenv
 
-from app.pipelines.converter import convert_video_to_audio, convert_audio_format
-from app.pipelines.transcriber import Transcriber
-from app.pipelines.summarizer import Summarizer
+from app.pipelines.converter import convert_video_to_audio, convert_audio_format, convert_and_denoise, stream_audio, get_duration
+from app.pipelines.transcriber import Transcriber, cuda_available, CORRECTION_WORKERS
+from app.pipelines.summarizer import Summarizer, chunk_from_segments
 from app.pipelines.preprocessor import enhance_audio
-from app.helper import JSONLogger
+from app.helper import JSONLogger, prefetch, log, write_json_atomic, get_response_cache
 from app.pipelines.senopati_model import SenopatiModel  
 
 load_dotenv()
 
-try:
-    print("Initializing Senopati Local Model...")
-    senopati_model = SenopatiModel()
-    print("Senopati model ready.")
-except Exception as e:
-    print(f"FATAL: Senopati model initialization failed: {e}")
-    exit(1)
+CACHE_DIR = Path("data/cache")
+# result cache bounds, oldest entries are evicted first
+CACHE_MAX_ENTRIES = 500
+CACHE_MAX_AGE = 30 * 24 * 3600
+# 30s PCM windows buffered between the FFmpeg reader and the transcriber,
+# and the most windows the transcriber keeps queued or decoding at once
+RING_SIZE = 4
+# Intermediate WAVs go to RAM-backed tmpfs when it has room (Docker's default /dev/shm is only 64MB)
+TMPFS_DIR = Path("/dev/shm/quicknote/audio")
+TMPFS_MIN_FREE = 1 << 30
+
+
+def _audio_workdir(run_id: str) -> Path:
+    """
+    Per-run directory for intermediate audio files: tmpfs when available, ./data/audio otherwise.
+    Separate run folders keep concurrent pipeline workers from cleaning up each other's files.
+    """
+    base_dir = Path("./data/audio")
+    try:
+        if shutil.disk_usage("/dev/shm").free >= TMPFS_MIN_FREE:
+            base_dir = TMPFS_DIR
+    except OSError:
+        pass
+    output_dir = base_dir / run_id
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return output_dir
+
+
+# Models are built on first use and reused for the life of the process,
+# so importing this module is cheap and Whisper weights load only once.
+@functools.lru_cache(maxsize=1)
+def _get_senopati():
+    log("Initializing Senopati Local Model...")
+    # one pooled connection per parallel correction request
+    model = SenopatiModel(pool_size=CORRECTION_WORKERS)
+    log("Senopati model ready.")
+    return model
+
+
+# keyed only by names from _allowed_transcriber_models, so the cache can't grow past that list
+@functools.lru_cache(maxsize=None)
+def _get_transcriber(model_name):
+    return Transcriber(model_name=model_name, senopati_model=_get_senopati())
+
+
+@functools.lru_cache(maxsize=1)
+def _get_summarizer():
+    return Summarizer(_get_senopati())
+
+
+def warm_up(model_names=None):
+    """
+    Load the models of this process ahead of the first request.
+    Used as the worker initializer of the API's process pool.
+    Defaults to every size _select_transcriber_model can pick on this machine;
+    WARMUP_MODELS (comma-separated, e.g. "small") narrows it.
+    """
+    if model_names is None:
+        model_names = _env_list("WARMUP_MODELS") or _selectable_models()
+    try:
+        for model_name in model_names:
+            _get_transcriber(model_name)
+        _get_summarizer()
+    except Exception as e:
+        # leave it to the first request's MODEL_INIT step to report
+        print(f"Model warm-up failed: {e}")
+
+
+def _env_list(name):
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
+def _selectable_models():
+    """
+    Whisper sizes _select_transcriber_model can return on this machine.
+    """
+    return ["base", "small"] + (["turbo"] if cuda_available() else [])
+
+
+def _allowed_transcriber_models():
+    """
+    Sizes a request may name: the auto-selectable ones plus EXTRA_TRANSCRIBER_MODELS
+    (comma-separated). Anything else would load one more model into every pool worker.
+    """
+    return _selectable_models() + _env_list("EXTRA_TRANSCRIBER_MODELS")
+
+
+def _select_transcriber_model(duration):
+    """
+    Pick the Whisper size from the audio length: short clips don't need a bigger
+    model, long recordings use turbo when a GPU is available.
+    """
+    if duration is None:
+        return "small"
+    if duration < 30:
+        return "base"
+    if duration <= 10 * 60 or not cuda_available():
+        return "small"
+    return "turbo"
+
+
+def _auto_chunk_size(transcript_length):
+    """
+    Scale chunk size with the transcript: about sqrt(chars / 1000) chunks, so short
+    transcripts aren't over-split and long ones don't explode the number of chunks to cluster.
+    """
+    target_chunks = max(1, round(math.sqrt(transcript_length / 1000)))
+    return max(1, transcript_length // target_chunks)
+
+
+def _cache_key(input_file: Path, **options) -> str:
+    """
+    SHA-256 of the source bytes plus the options that change the output.
+    """
+    digest = hashlib.sha256()
+    with open(input_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _prune_cache(cache_dir: Path, max_entries=CACHE_MAX_ENTRIES, max_age=CACHE_MAX_AGE):
+    """
+    Drop cached results older than max_age seconds, then keep only the newest max_entries.
+    """
+    entries = []
+    for path in cache_dir.glob("*.json"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    entries.sort(reverse=True)
+    now = time.time()
+    for index, (mtime, path) in enumerate(entries):
+        if index >= max_entries or now - mtime > max_age:
+            path.unlink(missing_ok=True)
 
 
 def run_pipeline(
@@ -25,12 +162,14 @@ def run_pipeline(
     denoise: bool = False,
     aggressive_denoise: bool = False,
     force_wav: bool = False,
-    transcriber_model: str = "small",
-    chunk_size: int = 2000,
-    language: str = None
+    transcriber_model: str = None,
+    chunk_size: int = None,
+    language: str = None,
+    batch_size: int = None
 ) -> dict:
     logger = JSONLogger()
     audio_path = None
+    enhanced_audio = None
 
     type_supported = [".mp4", ".mkv", ".mov", ".mp3", ".wav", ".m4a", ".flac", ".ogg"]
     logger.log("INITIALIZATION", "INFO", "Starting audio/video processing pipeline", 
@@ -49,111 +188,185 @@ def run_pipeline(
         return {"error": f"Unsupported file type: {input_type}"}
 
     logger.log("FILE_VALIDATION", "SUCCESS", "Input file validated", file_type=input_type)
+
+    allowed_models = _allowed_transcriber_models()
+    if transcriber_model is not None and transcriber_model not in allowed_models:
+        logger.log("FILE_VALIDATION", "ERROR", f"Unsupported transcriber model: {transcriber_model}",
+                   allowed_models=allowed_models)
+        return {"error": f"Unsupported transcriber model: {transcriber_model}"}
+
+    if transcriber_model is None:
+        duration = get_duration(input_file)
+        transcriber_model = _select_transcriber_model(duration)
+        logger.log("MODEL_SELECTION", "INFO", f"Auto-selected Whisper model '{transcriber_model}'",
+                   duration_seconds=duration)
+
+    cache_key = _cache_key(input_file,
+                           denoise=denoise,
+                           aggressive_denoise=aggressive_denoise,
+                           transcriber_model=transcriber_model,
+                           chunk_size=chunk_size,
+                           language=language,
+                           batch_size=batch_size)
+    cache_file = CACHE_DIR / f"{cache_key}.json"
+    cached = None
+    try:
+        # another worker's _prune_cache may delete the entry at any point, so a missing
+        # file is a plain miss; the age comes from the open handle to avoid a second lookup
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            if time.time() - os.fstat(f.fileno()).st_mtime <= CACHE_MAX_AGE:
+                cached = json.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.log("CACHE", "WARNING", f"Failed to read cache {cache_file}: {e}")
+    if cached is not None:
+        logger.log("CACHE", "SUCCESS", "Returning cached result", cache_file=str(cache_file))
+        logger.save()
+        return cached
+
     logger.log("AUDIO_CONVERSION", "INFO", "Starting audio format standardization")
-    
-    if input_type in [".mp4", ".mkv", ".mov"]:
-        logger.log("VIDEO_PROCESSING", "INFO", f"Processing video file: '{input_file.name}'")
-        output_dir = Path("./data/audio")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        audio_path = output_dir / f"{input_file.stem}.wav"
-        result = convert_video_to_audio(input_file, audio_path)
-
-        if result is None:
-            logger.log("VIDEO_PROCESSING", "ERROR", "Video conversion failed")
-            return {"error": "Video conversion failed"}
-        logger.log("VIDEO_PROCESSING", "SUCCESS", "Video converted to audio", output_file=str(audio_path))
-
-    elif input_type in [".mp3", ".wav", ".m4a", ".flac", ".ogg"]:
-        logger.log("AUDIO_PROCESSING", "INFO", f"Processing audio file: '{input_file.name}'")
-        if input_type != ".wav" or force_wav:
-            output_dir = Path("./data/audio")
-            output_dir.mkdir(parents=True, exist_ok=True)
-            audio_path = output_dir / f"{input_file.stem}_standardized.wav"
-            result = convert_audio_format(input_file, audio_path)
+
+    # Without enhancement nothing needs the whole file on disk: decode with FFmpeg
+    # and hand PCM windows to the transcriber while the rest is still decoding.
+    # The batched path needs the full waveform up front, so it keeps the file path.
+    stream_input = not (denoise or aggressive_denoise) and not batch_size
+    output_dir = _audio_workdir(uuid.uuid4().hex)
+    try:
+        if stream_input:
+            audio_path = input_file
+            logger.log("AUDIO_CONVERSION", "INFO", f"Streaming '{input_file.name}' from FFmpeg into the transcriber")
+
+        elif denoise and not aggressive_denoise:
+            # one decode + one filter graph instead of convert -> enhance round-trips
+            audio_path = output_dir / f"{input_file.stem}_denoised.wav"
+            result = convert_and_denoise(input_file, audio_path)
+
+            if result is None:
+                logger.log("AUDIO_CONVERSION", "ERROR", "Audio conversion with denoising failed")
+                return {"error": "Audio conversion failed"}
+            logger.log("AUDIO_CONVERSION", "SUCCESS", "Audio converted and denoised in one FFmpeg pass", output_file=str(audio_path))
+
+        elif input_type in [".mp4", ".mkv", ".mov"]:
+            logger.log("VIDEO_PROCESSING", "INFO", f"Processing video file: '{input_file.name}'")
+            audio_path = output_dir / f"{input_file.stem}.wav"
+            result = convert_video_to_audio(input_file, audio_path)
+
             if result is None:
-                logger.log("AUDIO_PROCESSING", "WARNING", "Audio format conversion failed. Using original file.")
+                logger.log("VIDEO_PROCESSING", "ERROR", "Video conversion failed")
+                return {"error": "Video conversion failed"}
+            logger.log("VIDEO_PROCESSING", "SUCCESS", "Video converted to audio", output_file=str(audio_path))
+
+        elif input_type in [".mp3", ".wav", ".m4a", ".flac", ".ogg"]:
+            logger.log("AUDIO_PROCESSING", "INFO", f"Processing audio file: '{input_file.name}'")
+            if input_type != ".wav" or force_wav:
+                audio_path = output_dir / f"{input_file.stem}_standardized.wav"
+                result = convert_audio_format(input_file, audio_path)
+                if result is None:
+                    logger.log("AUDIO_PROCESSING", "WARNING", "Audio format conversion failed. Using original file.")
+                    audio_path = input_file
+                else:
+                    logger.log("AUDIO_PROCESSING", "SUCCESS", "Audio format standardized", output_file=str(audio_path))
+            else:
                 audio_path = input_file
+                logger.log("AUDIO_PROCESSING", "INFO", f"Using WAV file directly: {audio_path.name}")
+
+        if aggressive_denoise:
+            logger.log("AUDIO_ENHANCEMENT", "INFO", "Starting audio enhancement", aggressive_mode=aggressive_denoise)
+            # kept in memory and passed to Whisper as a waveform, no re-encode/re-decode
+            enhanced_audio = enhance_audio(audio_path, aggressive_mode=aggressive_denoise)
+            if enhanced_audio is not None:
+                logger.log("AUDIO_ENHANCEMENT", "SUCCESS", "Audio enhancement completed")
             else:
-                logger.log("AUDIO_PROCESSING", "SUCCESS", "Audio format standardized", output_file=str(audio_path))
-        else:
-            audio_path = input_file
-            logger.log("AUDIO_PROCESSING", "INFO", f"Using WAV file directly: {audio_path.name}")
-
-    if denoise or aggressive_denoise:
-        logger.log("AUDIO_ENHANCEMENT", "INFO", "Starting audio enhancement", aggressive_mode=aggressive_denoise)
-        enhanced_audio_path = enhance_audio(audio_path, aggressive_mode=aggressive_denoise)
-        if enhanced_audio_path:
-            audio_path = enhanced_audio_path
-            logger.log("AUDIO_ENHANCEMENT", "SUCCESS", "Audio enhancement completed")
+                logger.log("AUDIO_ENHANCEMENT", "ERROR", "Audio enhancement failed. Proceeding with original audio.")
+        elif denoise:
+            logger.log("AUDIO_ENHANCEMENT", "INFO", "Audio denoised during conversion")
         else:
-            logger.log("AUDIO_ENHANCEMENT", "ERROR", "Audio enhancement failed. Proceeding with original audio.")
-    else:
-        logger.log("AUDIO_ENHANCEMENT", "INFO", "Audio enhancement skipped by user choice")
+            logger.log("AUDIO_ENHANCEMENT", "INFO", "Audio enhancement skipped by user choice")
 
-    logger.log("MODEL_INIT", "INFO", "Initializing AI models")
-    try:
-        transcriber = Transcriber(model_name=transcriber_model, senopati_model=senopati_model)
-        summarizer = Summarizer(senopati_model)
-        logger.log("MODEL_INIT", "SUCCESS", "AI models initialized successfully")
-    except Exception as e:
-        logger.log("MODEL_INIT", "ERROR", f"Initialization error: {e}")
-        return {"error": f"Model initialization failed: {str(e)}"}
-
-    # transcribe
-    logger.log("TRANSCRIPTION", "INFO", f"Starting transcription of: {audio_path.name}")
-    result, detected_language = transcriber.transcribe(audio_path, language=language)
-    if result:
-        logger.log("TRANSCRIPTION", "SUCCESS", "Transcription completed",
-                   detected_language=detected_language,
-                   transcript_length_chars=len(result))
-        logger.log("CORRECTION", "INFO", "Applying language rule correction")
-        transcript = transcriber.language_rules(result, detected_language)
-        logger.log("CORRECTION", "SUCCESS", "Language correction applied")
-    else:
-        logger.log("TRANSCRIPTION", "ERROR", "Transcription failed")
-        return {"error": "Transcription failed"}
-
-    # chunking
-    logger.log("TEXT_PROCESSING", "INFO", "Starting text processing and summarization")
-    chunks = summarizer.chunk_text(transcript, chunk_size)
-    logger.log("TEXT_CHUNKING", "SUCCESS", "Text split into chunks",
-               num_chunks=len(chunks),
-               chunk_size=chunk_size)
-
-    # clustering
-    if len(chunks) > 7:
-        logger.log("CLUSTERING", "INFO", "Clustering chunks by topic")
-        clusters = summarizer.cluster_chunks(chunks)
-        logger.log("CLUSTERING", "SUCCESS", "Topic clustering completed",
-                   num_clusters=len(clusters))
-    else:
-        clusters = {0: chunks}
-        logger.log("CLUSTERING", "INFO", "Few Chunks - no clustering needed")
-
-    # summarize
-    logger.log("SUMMARIZATION", "INFO", "Generating comprehensive summary")
-    cluster_summaries, final_summary = summarizer.get_final_summary(clusters, language=detected_language)
-    logger.log("SUMMARIZATION", "SUCCESS", "Final summary generated",
-               summary_length_chars=len(final_summary))
-
-    logger.log("PIPELINE_COMPLETE", "SUCCESS", "Pipeline completed successfully")
-    logger.save()
-
-    # CLEANUP
-    temp_folders  = [Path("data/audio/enhanced"), Path("data/temp"), Path("data/audio")]
-    for folder in temp_folders:
+        logger.log("MODEL_INIT", "INFO", "Initializing AI models")
         try:
-            if folder.exists():
-                for file in folder.rglob("*"):
-                    if file.is_file():
-                        file.unlink()
+            transcriber = _get_transcriber(transcriber_model)
+            summarizer = _get_summarizer()
+            logger.log("MODEL_INIT", "SUCCESS", "AI models initialized successfully")
         except Exception as e:
-            logger.log("CLEANUP", "WARNING", f"Failed to clean up {folder}: {e}")
-
-    return {
-        "summary": final_summary,
-        "transcript": transcript,
-        "detected_language": detected_language,
-        "chunks": chunks,
-        "cluster_summaries": cluster_summaries
-    }
+            logger.log("MODEL_INIT", "ERROR", f"Initialization error: {e}")
+            return {"error": f"Model initialization failed: {str(e)}"}
+
+        # transcribe
+        logger.log("TRANSCRIPTION", "INFO", f"Starting transcription of: {audio_path.name}")
+        if stream_input:
+            transcription = transcriber.transcribe_stream(
+                prefetch(stream_audio(input_file), maxsize=RING_SIZE), language=language, max_pending=RING_SIZE)
+        else:
+            audio_input = enhanced_audio if enhanced_audio is not None else audio_path
+            transcription = transcriber.transcribe(audio_input, language=language, batch_size=batch_size)
+        result, detected_language, segments = transcription or (None, None, None)
+        if result:
+            logger.log("TRANSCRIPTION", "SUCCESS", "Transcription completed",
+                       detected_language=detected_language,
+                       transcript_length_chars=len(result))
+        else:
+            logger.log("TRANSCRIPTION", "ERROR", "Transcription failed")
+            return {"error": "Transcription failed"}
+
+        # chunking
+        logger.log("TEXT_PROCESSING", "INFO", "Starting text processing and summarization")
+        if chunk_size is None:
+            chunk_size = _auto_chunk_size(len(result))
+        chunks = chunk_from_segments(segments, chunk_size)
+        logger.log("TEXT_CHUNKING", "SUCCESS", "Text split into chunks",
+                   num_chunks=len(chunks),
+                   chunk_size=chunk_size)
+
+        # correction, one request per chunk in parallel instead of one giant prompt
+        logger.log("CORRECTION", "INFO", "Applying language rule correction")
+        chunks, corrections_failed = transcriber.correct_chunks(chunks, detected_language)
+        transcript = " ".join(chunks)
+        if corrections_failed:
+            logger.log("CORRECTION", "WARNING", "Some chunks kept their raw transcript",
+                       failed_chunks=corrections_failed)
+        else:
+            logger.log("CORRECTION", "SUCCESS", "Language correction applied")
+
+        # clustering
+        if len(chunks) > 7:
+            logger.log("CLUSTERING", "INFO", "Clustering chunks by topic")
+            clusters = summarizer.cluster_chunks(chunks)
+            logger.log("CLUSTERING", "SUCCESS", "Topic clustering completed",
+                       num_clusters=len(clusters))
+        else:
+            clusters = {0: chunks}
+            logger.log("CLUSTERING", "INFO", "Few Chunks - no clustering needed")
+
+        # summarize
+        logger.log("SUMMARIZATION", "INFO", "Generating comprehensive summary")
+        cluster_summaries, final_summary = summarizer.get_final_summary(clusters, language=detected_language)
+        logger.log("SUMMARIZATION", "SUCCESS", "Final summary generated",
+                   summary_length_chars=len(final_summary))
+
+        logger.log("PIPELINE_COMPLETE", "SUCCESS", "Pipeline completed successfully")
+        logger.save()
+
+        output = {
+            "summary": final_summary,
+            "transcript": transcript,
+            "detected_language": detected_language,
+            "chunks": chunks,
+            "cluster_summaries": cluster_summaries
+        }
+
+        # kept outside the per-run audio folder so later runs can reuse it;
+        # a degraded result (correction fell back) is not cached so a retry can do better
+        if not corrections_failed:
+            try:
+                write_json_atomic(cache_file, output)
+                _prune_cache(CACHE_DIR)
+                _prune_cache(get_response_cache().cache_dir, max_entries=10 * CACHE_MAX_ENTRIES)
+            except Exception as e:
+                print(f"Failed to write cache {cache_file}: {e}")
+
+        return output
+    finally:
+        # CLEANUP: the per-run audio folder is the only scratch space, removed on every exit
+        shutil.rmtree(output_dir, ignore_errors=True)